@@ -1,22 +1,334 @@
 from flask import Flask, request, jsonify, send_file
 import pandas as pd
-from sklearn.cluster import KMeans, DBSCAN, MeanShift, AgglomerativeClustering
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+from sklearn.cluster import KMeans, DBSCAN, estimate_bandwidth
+from sklearn.neighbors import NearestNeighbors
 from scipy.cluster.hierarchy import linkage, fcluster
+from scipy.sparse import csr_matrix
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from threadpoolctl import threadpool_limits
+import multiprocessing
+import hashlib
+import io
+import numpy as np
 import os
+import tempfile
+import threading
+
+try:
+    from blake3 import blake3
+except ImportError:
+    blake3 = hashlib.blake2b
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+try:
+    import kmeans_numba
+except ImportError:
+    kmeans_numba = None
+
+try:
+    import ward_numba
+except ImportError:
+    ward_numba = None
+
+try:
+    import fastcluster
+except ImportError:
+    fastcluster = None
+
+try:
+    import cuml
+except ImportError:
+    cuml = None
+
+try:
+    import libKMCUDA
+except ImportError:
+    libKMCUDA = None
 
 app = Flask(__name__)
 
+# Below this many n*k*d distance terms, JIT dispatch and threading cost more than they save.
+NUMBA_MIN_WORK = 100_000
+
+# KMeans inputs with at least this many samples go to the GPU when cuML or kmcuda is available.
+GPU_MIN_SAMPLES = 100_000
+
+# From this many features on, distances go through ||x||^2 + ||y||^2 - 2 x.y and BLAS;
+# below it KMeans uses the Numba kernel and DBSCAN a ball tree.
+GEMM_MIN_FEATURES = 16
+
+# Edge of the square distance tiles; a 256 x 256 float64 tile (512 KiB) stays in L2. Below
+# GEMM_MIN_FEATURES tiles have 256 // d rows instead, so the d-wide difference block stays at 256 KiB.
+PAIRWISE_TILE = 256
+
+# Linkage methods every hierarchical backend understands (the numba backend runs ward only).
+LINKAGE_METHODS = ('single', 'complete', 'average', 'weighted', 'centroid', 'median', 'ward')
+
+# Linkage methods fastcluster can run on raw observations in O(n) memory.
+VECTOR_LINKAGE_METHODS = {'single', 'ward', 'centroid', 'median'}
+
+# Below this many samples scipy's linkage is fast enough; above it the 'auto' backend uses fastcluster,
+# or the Numba ward kernel when fastcluster is missing.
+HIERARCHICAL_SCIPY_MAX_SAMPLES = 5000
+
+# Download name and MIME type for each supported 'format' form value.
+OUTPUT_FORMATS = {
+    'parquet': ("clusters_output.parquet", 'application/vnd.apache.parquet'),
+    'feather': ("clusters_output.feather", 'application/vnd.apache.arrow.file'),
+    'xlsx': ("clusters_output.xlsx", 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+
+# Parsed uploads keyed by file content hash, so repeat uploads skip the Excel parse.
+PARSED_FRAME_CACHE_SIZE = 16
+_parsed_frames = OrderedDict()
+
+# Guards _parsed_frames and _cluster_results, which Flask's request threads share.
+_cache_lock = threading.Lock()
+
+# Feature matrices saved as .npy files for memory-mapping, shared by every worker process on the host.
+FEATURE_STORE_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+FEATURE_STORE_SIZE = 32
+# /dev/shm is RAM, so the store is also capped in bytes; the newest file is always kept.
+FEATURE_STORE_BYTES = 1 << 30
+
+# Clustering results kept per (file hash, method, parameters).
+RESULT_CACHE_SIZE = 64
+_cluster_results = OrderedDict()
+
+# Worker processes that run clustering off the request threads; created on first use. Each worker
+# caps its Numba, BLAS and joblib threads so that busy workers together do not oversubscribe the cores.
+WORKER_PROCESSES = min(4, os.cpu_count() or 1)
+WORKER_THREADS = max(1, (os.cpu_count() or 1) // WORKER_PROCESSES)
+_executor = None
+_executor_lock = threading.Lock()
+
+# Radius-neighbor graphs of recent DBSCAN inputs, keyed by (dtype, shape, content hash, eps).
+NEIGHBOR_GRAPH_CACHE_SIZE = 16
+_neighbor_graphs = OrderedDict()
+
+
+def squared_norms(data, offset=None):
+    """
+    Return the squared Euclidean norm of every row of data, less offset when given, in float64.
+    بازگرداندن مربع نرم اقلیدسی هر سطر داده، پس از کم کردن offset در صورت وجود، با دقت float64.
+    إرجاع مربع الطول الإقليدي لكل صف من البيانات، بعد طرح offset إن وُجد، بدقة float64.
+    Retourner le carré de la norme euclidienne de chaque ligne, moins offset s'il est donné, en float64.
+    """
+    # Subtracting a float64 offset already upcasts, so only one n x d temporary is built either way.
+    data = np.asarray(data, dtype=np.float64) if offset is None else np.asarray(data) - offset
+    return np.einsum('ij,ij->i', data, data)
+
+
+def centered_squared_norms(data):
+    """
+    Return (offset, x_sq): the column means of data and the float64 squared norms of its rows about them.
+    بازگرداندن (offset, x_sq): میانگین ستون‌های داده و مربع نرم float64 سطرها نسبت به آن.
+    إرجاع (offset, x_sq): متوسطات أعمدة البيانات ومربعات أطوال صفوفها حولها بدقة float64.
+    Retourner (offset, x_sq) : les moyennes des colonnes et les normes carrées float64 des lignes autour d'elles.
+    """
+    # Norms are taken about the column means so the distance expansion does not cancel.
+    offset = data.mean(axis=0, dtype=np.float64)
+    return offset, squared_norms(data, offset)
+
+
+def squared_distance_tiles(A, a_sq, B, b_sq, offset):
+    """
+    Yield (i0, j0, D) where D holds squared distances between tiles A[i0:] and B[j0:].
+    تولید (i0, j0, D) که D مربع فاصله بین کاشیهای A[i0:] و B[j0:] است.
+    توليد (i0, j0, D) حيث D مربعات المسافات بين البلاطات A[i0:] و B[j0:].
+    Produire (i0, j0, D) où D contient les distances carrées entre les tuiles A[i0:] et B[j0:].
+    a_sq and b_sq are the float64 squared norms of A - offset and B - offset.
+    a_sq و b_sq مربع نرم‌های float64 برای A - offset و B - offset هستند.
+    a_sq و b_sq هما مربعات أطوال float64 لـ A - offset و B - offset.
+    a_sq et b_sq sont les normes carrées float64 de A - offset et B - offset.
+    """
+    if A.shape[1] < GEMM_MIN_FEATURES:
+        # With few features, direct differences cost little more than a GEMM and cannot cancel.
+        rows = max(1, PAIRWISE_TILE // max(1, A.shape[1]))
+        for i0 in range(0, len(A), rows):
+            A_tile = A[i0:i0 + rows]
+            for j0 in range(0, len(B), PAIRWISE_TILE):
+                diff = A_tile[:, None, :] - B[j0:j0 + PAIRWISE_TILE][None, :, :]
+                yield i0, j0, np.einsum('ijk,ijk->ij', diff, diff)
+        return
+    for i0 in range(0, len(A), PAIRWISE_TILE):
+        A_tile = A[i0:i0 + PAIRWISE_TILE]
+        # The expansion subtracts two large norms; centering and float64 keep it exact near eps,
+        # as sklearn's _euclidean_distances_upcast does for float32 input.
+        A_tile = A_tile.astype(np.float64) - offset
+        for j0 in range(0, len(B), PAIRWISE_TILE):
+            D = np.dot(A_tile, (B[j0:j0 + PAIRWISE_TILE].astype(np.float64) - offset).T)
+            D *= -2.0
+            D += a_sq[i0:i0 + PAIRWISE_TILE, None]
+            D += b_sq[None, j0:j0 + PAIRWISE_TILE]
+            yield i0, j0, D
+
+
+def pairwise_radius_graph(data, eps, x_sq, offset):
+    """
+    Build the eps-neighborhood distance graph tile by tile, keeping only pairs within eps.
+    ساخت گراف همسایگی eps به صورت کاشی به کاشی، تنها با نگهداری جفتهای درون eps.
+    بناء رسم الجوار eps بلاطة تلو الأخرى، مع الاحتفاظ بالأزواج ضمن eps فقط.
+    Construire le graphe de voisinage eps tuile par tuile, en ne gardant que les paires dans eps.
+    """
+    n = len(data)
+    eps_sq = eps * eps
+    rows, cols, values = [], [], []
+    for i0, j0, D in squared_distance_tiles(data, x_sq, data, x_sq, offset):
+        r, c = np.nonzero(D <= eps_sq)
+        values.append(np.sqrt(np.maximum(D[r, c], 0)).astype(np.float32))
+        r += i0
+        c += j0
+        rows.append(r)
+        cols.append(c)
+    rows, cols, values = np.concatenate(rows), np.concatenate(cols), np.concatenate(values)
+    keep = rows != cols
+    return csr_matrix((values[keep], (rows[keep], cols[keep])), shape=(n, n))
+
+
+def mean_shift(data, x_sq, offset, bandwidth, max_iter=300):
+    """
+    Flat-kernel MeanShift seeded at every sample; return (labels, cluster_centers).
+    MeanShift با هسته تخت که از هر نمونه آغاز میشود؛ بازگرداندن (برچسبها، مراکز).
+    MeanShift بنواة مسطحة تبدأ من كل عينة؛ إرجاع (التسميات، المراكز).
+    MeanShift à noyau plat initialisé sur chaque échantillon ; retourner (étiquettes, centres).
+    """
+    bandwidth_sq = bandwidth * bandwidth
+    stop_thresh = 1e-3 * bandwidth
+    seeds = np.array(data, dtype=np.float32)
+    intensity = np.zeros(len(seeds), dtype=np.int64)
+    active = np.arange(len(seeds))
+    for _ in range(max_iter):
+        if not active.size:
+            break
+        S = seeds[active]
+        sums = np.zeros(S.shape, dtype=np.float64)
+        counts = np.zeros(len(S), dtype=np.int64)
+        # The mask from each distance tile is multiplied straight back into the same data tile.
+        s_sq = squared_norms(S, offset) if data.shape[1] >= GEMM_MIN_FEATURES else None
+        for i0, j0, D in squared_distance_tiles(S, s_sq, data, x_sq, offset):
+            within = (D <= bandwidth_sq).astype(np.float32)
+            sums[i0:i0 + len(within)] += np.dot(within, data[j0:j0 + within.shape[1]])
+            counts[i0:i0 + len(within)] += within.sum(axis=1).astype(np.int64)
+        empty = counts == 0
+        shifted = (sums / np.maximum(counts, 1)[:, None]).astype(np.float32)
+        shifted[empty] = S[empty]
+        converged = np.sqrt(((shifted - S) ** 2).sum(axis=1)) <= stop_thresh
+        seeds[active] = shifted
+        intensity[active] = counts
+        active = active[~(empty | converged)]
+
+    centers, intensity = seeds[intensity > 0], intensity[intensity > 0]
+    if not len(centers):
+        raise ValueError("No point lies within the MeanShift bandwidth of any seed.")
+    # Like sklearn: keep the densest center of every group closer than one bandwidth.
+    centers = centers[np.argsort(-intensity, kind='stable')]
+    near = NearestNeighbors(radius=bandwidth).fit(centers).radius_neighbors(centers, return_distance=False)
+    unique = np.ones(len(centers), dtype=bool)
+    for i, neighbors in enumerate(near):
+        if unique[i]:
+            unique[neighbors] = False
+            unique[i] = True
+    centers = centers[unique]
+    labels = NearestNeighbors(n_neighbors=1).fit(centers).kneighbors(data, return_distance=False)[:, 0]
+    return labels, centers
+
+
+def dbscan_vectorized(graph, min_samples):
+    """
+    DBSCAN over a precomputed CSR neighbor graph, expanding whole frontiers with NumPy instead of point by point.
+    DBSCAN روی گراف همسایگی CSR، با گسترش کل جبهه با NumPy به جای نقطه به نقطه.
+    DBSCAN على رسم جوار CSR محسوب مسبقاً، بتوسيع الجبهة كاملة عبر NumPy بدلاً من نقطة بنقطة.
+    DBSCAN sur un graphe de voisinage CSR, en étendant tout le front avec NumPy plutôt que point par point.
+    """
+    graph = csr_matrix(graph)
+    n = graph.shape[0]
+    # The graph leaves out each point itself, which DBSCAN counts toward min_samples.
+    core = np.diff(graph.indptr) + 1 >= min_samples
+    labels = np.full(n, -1, dtype=np.intp)
+    label = 0
+    for seed in np.flatnonzero(core):
+        if labels[seed] != -1:
+            continue
+        labels[seed] = label
+        frontier = np.array([seed])
+        while frontier.size:
+            # One sparse row gather ORs together the neighborhoods of the whole frontier.
+            candidates = np.unique(graph[frontier].indices)
+            candidates = candidates[labels[candidates] == -1]
+            labels[candidates] = label
+            frontier = candidates[core[candidates]]
+        label += 1
+    return labels
+
+
+def radius_neighbors_graph(data, eps):
+    """
+    Return the sparse eps-neighborhood distance graph of data, reusing it for repeated inputs.
+    بازگرداندن گراف همسایگی شعاع eps برای داده‌ها، با استفاده مجدد برای ورودی‌های تکراری.
+    إرجاع رسم الجوار بنصف القطر eps للبيانات، مع إعادة استخدامه للمدخلات المتكررة.
+    Retourner le graphe de voisinage de rayon eps, réutilisé pour les entrées répétées.
+    """
+    key = (data.dtype.str, data.shape, hash(data.tobytes()), eps)
+    graph = _neighbor_graphs.get(key)
+    if graph is not None:
+        _neighbor_graphs.move_to_end(key)
+        return graph
+    if data.shape[1] >= GEMM_MIN_FEATURES:
+        offset, x_sq = centered_squared_norms(data)
+        graph = pairwise_radius_graph(data, eps, x_sq, offset)
+    else:
+        nn = NearestNeighbors(radius=eps, algorithm='ball_tree', n_jobs=WORKER_THREADS).fit(data)
+        graph = nn.radius_neighbors_graph(mode='distance')
+    _neighbor_graphs[key] = graph
+    if len(_neighbor_graphs) > NEIGHBOR_GRAPH_CACHE_SIZE:
+        _neighbor_graphs.popitem(last=False)
+    return graph
+
+
+def load_features(features):
+    """
+    Return features as an array, memory-mapping it read-only when given the path of a .npy file.
+    بازگرداندن ویژگیها به صورت آرایه، با نگاشت حافظه فقطخواندنی اگر مسیر فایل .npy داده شود.
+    إرجاع الميزات كمصفوفة، مع ربطها بالذاكرة للقراءة فقط إذا أُعطي مسار ملف .npy.
+    Retourner les caractéristiques sous forme de tableau, mappé en lecture seule si un chemin .npy est donné.
+    """
+    if isinstance(features, (str, os.PathLike)):
+        return np.load(features, mmap_mode='r')
+    return features
+
+
 class KMeansClusterer:
-    def init(self, data, n_clusters):
+    def __init__(self, data, n_clusters):
         """
         Initialize KMeans clustering.
         مقداردهی اولیه خوشهبندی KMeans.
         تهيئة KMeans للتصنيف.
         Initialiser le clustering KMeans.
+        data is a C-contiguous float32 array with one row per sample, or the path of one saved as .npy.
+        data آرایه float32 پیوسته سطری است که هر سطر آن یک نمونه است، یا مسیر فایل .npy آن.
+        data مصفوفة float32 متصلة صفياً، كل صف فيها عينة واحدة، أو مسار ملف .npy يحتويها.
+        data est un tableau float32 contigu en lignes, une ligne par échantillon, ou le chemin d'un fichier .npy.
         """
-        self.data = data
+        self.data = load_features(data)
         self.n_clusters = n_clusters
         self.model = None
+        self.cluster_centers = None
+        if cuml is not None:
+            self._backend = 'cuml'
+        elif libKMCUDA is not None:
+            self._backend = 'kmcuda'
+        else:
+            self._backend = 'cpu'
 
     def fit_predict(self):
         """
@@ -25,21 +337,55 @@ class KMeansClusterer:
         تطبيق KMeans وإرجاع التسميات.
         Appliquer KMeans et retourner les étiquettes.
         """
-        self.model = KMeans(n_clusters=self.n_clusters)
-        return self.model.fit_predict(self.data)
+        data = np.ascontiguousarray(self.data, dtype=np.float32)
+        if not 1 <= self.n_clusters <= len(data):
+            raise ValueError(f"n_clusters must be between 1 and the number of samples ({len(data)}).")
+        if self._backend != 'cpu' and len(data) >= GPU_MIN_SAMPLES:
+            return self._fit_predict_gpu(data)
+        if kmeans_numba is None or data.size * self.n_clusters < NUMBA_MIN_WORK:
+            self.model = KMeans(n_clusters=self.n_clusters)
+            labels = self.model.fit_predict(data)
+            self.cluster_centers = self.model.cluster_centers_
+            return labels
+        # The norms are only needed, and only built, on the GEMM path.
+        offset, x_sq = centered_squared_norms(data) if data.shape[1] >= GEMM_MIN_FEATURES else (None, None)
+        labels, self.cluster_centers, _ = kmeans_numba.lloyd(
+            data, self.n_clusters, max_iter=300, tol=1e-4, x_sq=x_sq, offset=offset
+        )
+        return labels
+
+    def _fit_predict_gpu(self, data):
+        """
+        Run KMeans on the GPU with cuML or kmcuda and return labels.
+        اجرای KMeans روی GPU با cuML یا kmcuda و بازگرداندن برچسبها.
+        تشغيل KMeans على GPU باستخدام cuML أو kmcuda وإرجاع التسميات.
+        Exécuter KMeans sur GPU avec cuML ou kmcuda et retourner les étiquettes.
+        """
+        if self._backend == 'cuml':
+            self.model = cuml.KMeans(n_clusters=self.n_clusters, n_init=1, output_type='numpy')
+            labels = self.model.fit_predict(data)
+            self.cluster_centers = self.model.cluster_centers_
+            return labels
+        self.cluster_centers, labels = libKMCUDA.kmeans_cuda(data, self.n_clusters, init='k-means++', device=0)
+        return labels
 
 
 class DBSCANClusterer:
-    def init(self, data, eps=0.5, min_samples=5):
+    def __init__(self, data, eps=0.5, min_samples=5, vectorized=False):
         """
         Initialize DBSCAN clustering.
         مقداردهی اولیه خوشهبندی DBSCAN.
         تهيئة DBSCAN للتصنيف.
         Initialiser le clustering DBSCAN.
+        data is a C-contiguous float32 array with one row per sample, or the path of one saved as .npy.
+        data آرایه float32 پیوسته سطری است که هر سطر آن یک نمونه است، یا مسیر فایل .npy آن.
+        data مصفوفة float32 متصلة صفياً، كل صف فيها عينة واحدة، أو مسار ملف .npy يحتويها.
+        data est un tableau float32 contigu en lignes, une ligne par échantillon, ou le chemin d'un fichier .npy.
         """
-        self.data = data
+        self.data = load_features(data)
         self.eps = eps
         self.min_samples = min_samples
+        self.vectorized = vectorized
         self.model = None
 
     def fit_predict(self):
@@ -49,22 +395,31 @@ class DBSCANClusterer:
         تطبيق DBSCAN وإرجاع التسميات.
         Appliquer DBSCAN et retourner les étiquettes.
         """
-        self.model = DBSCAN(eps=self.eps, min_samples=self.min_samples)
-        return self.model.fit_predict(self.data)
+        data = np.ascontiguousarray(self.data, dtype=np.float32)
+        graph = radius_neighbors_graph(data, self.eps)
+        if self.vectorized:
+            return dbscan_vectorized(graph, self.min_samples)
+        self.model = DBSCAN(eps=self.eps, min_samples=self.min_samples, metric='precomputed')
+        return self.model.fit_predict(graph)
 
 
 class HierarchicalClusterer:
-    def init(self, data, method='ward', threshold=1.5, criterion='distance'):
+    def __init__(self, data, method='ward', threshold=1.5, criterion='distance', backend='auto'):
         """
         Initialize Hierarchical clustering.
         مقداردهی اولیه خوشهبندی سلسلهمراتبی.
         تهيئة التصنيف الهرمي.
         Initialiser le clustering hiérarchique.
+        data is a C-contiguous float32 array with one row per sample, or the path of one saved as .npy.
+        data آرایه float32 پیوسته سطری است که هر سطر آن یک نمونه است، یا مسیر فایل .npy آن.
+        data مصفوفة float32 متصلة صفياً، كل صف فيها عينة واحدة، أو مسار ملف .npy يحتويها.
+        data est un tableau float32 contigu en lignes, une ligne par échantillon, ou le chemin d'un fichier .npy.
         """
-        self.data = data
+        self.data = load_features(data)
         self.method = method
         self.threshold = threshold
         self.criterion = criterion
+        self.backend = backend
         self.linkage_matrix = None
 
     def fit_predict(self):
@@ -74,20 +429,56 @@ class HierarchicalClusterer:
         تطبيق التصنيف الهرمي وإرجاع التسميات.
         Appliquer le clustering hiérarchique et retourner les étiquettes.
         """
-        self.linkage_matrix = linkage(self.data, method=self.method)
+        if self.method not in LINKAGE_METHODS:
+            raise ValueError("Invalid linkage method. Choose 'single', 'complete', 'average', 'weighted', 'centroid', "
+                             "'median', or 'ward'.")
+        backend = self.backend
+        if backend == 'auto':
+            if len(self.data) < HIERARCHICAL_SCIPY_MAX_SAMPLES:
+                backend = 'scipy'
+            elif fastcluster is not None:
+                backend = 'fastcluster'
+            elif self.method == 'ward' and ward_numba is not None:
+                backend = 'numba'
+            else:
+                backend = 'scipy'
+
+        if backend == 'scipy':
+            self.linkage_matrix = linkage(self.data, method=self.method)
+        elif backend == 'fastcluster':
+            if fastcluster is None:
+                raise ValueError("The 'fastcluster' backend requires the fastcluster package.")
+            data = np.ascontiguousarray(self.data, dtype=np.float64)
+            if self.method in VECTOR_LINKAGE_METHODS:
+                self.linkage_matrix = fastcluster.linkage_vector(data, method=self.method, metric='euclidean')
+            else:
+                self.linkage_matrix = fastcluster.linkage(data, method=self.method)
+        elif backend == 'numba':
+            if ward_numba is None:
+                raise ValueError("The 'numba' backend requires the numba package.")
+            if self.method != 'ward':
+                raise ValueError("The 'numba' backend only supports ward linkage.")
+            self.linkage_matrix = ward_numba.ward_linkage(self.data)
+        else:
+            raise ValueError("Invalid hierarchical backend. Choose 'auto', 'scipy', 'fastcluster', or 'numba'.")
         return fcluster(self.linkage_matrix, t=self.threshold, criterion=self.criterion)
 
 
 class MeanShiftClusterer:
-    def init(self, data):
+    def __init__(self, data):
         """
         Initialize MeanShift clustering.
         مقداردهی اولیه خوشهبندی MeanShift.
         تهيئة MeanShift للتصنيف.
         Initialiser le clustering MeanShift.
+        data is a C-contiguous float32 array with one row per sample, or the path of one saved as .npy.
+        data آرایه float32 پیوسته سطری است که هر سطر آن یک نمونه است، یا مسیر فایل .npy آن.
+        data مصفوفة float32 متصلة صفياً، كل صف فيها عينة واحدة، أو مسار ملف .npy يحتويها.
+        data est un tableau float32 contigu en lignes, une ligne par échantillon, ou le chemin d'un fichier .npy.
         """
-        self.data = data
+        self.data = load_features(data)
         self.model = None
+        self.cluster_centers = None
 
     def fit_predict(self):
         """
@@ -96,19 +487,29 @@ class MeanShiftClusterer:
         تطبيق MeanShift وإرجاع التسميات.
         Appliquer MeanShift et retourner les étiquettes.
         """
-        self.model = MeanShift()
-        return self.model.fit_predict(self.data)
+        data = np.ascontiguousarray(self.data, dtype=np.float32)
+        bandwidth = estimate_bandwidth(data, n_jobs=WORKER_THREADS)
+        if bandwidth <= 0:
+            raise ValueError("MeanShift could not estimate a positive bandwidth for this data.")
+        # Below GEMM_MIN_FEATURES the tiles use direct differences and need no norms.
+        offset, x_sq = centered_squared_norms(data) if data.shape[1] >= GEMM_MIN_FEATURES else (None, None)
+        labels, self.cluster_centers = mean_shift(data, x_sq, offset, bandwidth)
+        return labels
 
 
 class AgglomerativeClusterer:
-    def init(self, data, n_clusters=2):
+    def __init__(self, data, n_clusters=2):
         """
         Initialize Agglomerative clustering.
         مقداردهی اولیه خوشهبندی Agglomerative.
         تهيئة التصنيف التجميعي.
         Initialiser le clustering agglomératif.
+        data is a C-contiguous float32 array with one row per sample, or the path of one saved as .npy.
+        data آرایه float32 پیوسته سطری است که هر سطر آن یک نمونه است، یا مسیر فایل .npy آن.
+        data مصفوفة float32 متصلة صفياً، كل صف فيها عينة واحدة، أو مسار ملف .npy يحتويها.
+        data est un tableau float32 contigu en lignes, une ligne par échantillon, ou le chemin d'un fichier .npy.
         """
-        self.data = data
+        self.data = load_features(data)
         self.n_clusters = n_clusters
         self.model = None
 
@@ -119,26 +520,108 @@ class AgglomerativeClusterer:
         تطبيق التصنيف التجميعي وإرجاع التسميات.
         Appliquer le clustering agglomératif et retourner les étiquettes.
         """
-        self.model = AgglomerativeClustering(n_clusters=self.n_clusters)
-        return self.model.fit_predict(self.data)
+        if not 1 <= self.n_clusters <= len(self.data):
+            raise ValueError(f"n_clusters must be between 1 and the number of samples ({len(self.data)}).")
+        self.model = HierarchicalClusterer(self.data, method='ward', threshold=self.n_clusters, criterion='maxclust')
+        # fcluster numbers clusters from 1; keep the 0-based labels this endpoint has always returned.
+        return self.model.fit_predict() - 1
+
+
 
+def feature_matrix(data):
+    """
+    Return every column except 'Name' as a C-contiguous float32 array.
+    بازگرداندن همه ستونها به جز 'Name' به صورت آرایه float32 پیوسته.
+    إرجاع جميع الأعمدة عدا 'Name' كمصفوفة float32 متصلة.
+    Retourner toutes les colonnes sauf 'Name' sous forme de tableau float32 contigu.
+    """
+    features = np.ascontiguousarray(data.drop(columns=['Name']).to_numpy(dtype=np.float32, copy=False), dtype=np.float32)
+    assert features.flags['C_CONTIGUOUS']
+    # Empty cells arrive as NaN; the Numba and BLAS paths would return wrong labels instead of failing.
+    if not np.isfinite(features).all():
+        raise ValueError("Input features contain NaN or infinite values; fill or remove empty cells.")
+    return features
 
-def perform_clustering(data, method='kmeans', n_clusters=3, eps=0.5, min_samples=5, threshold=1.5):
+
+def store_features(file_hash, data):
+    """
+    Save the feature matrix of a parsed upload under FEATURE_STORE_DIR once and return its path.
+    ذخیره یکباره ماتریس ویژگیهای فایل تجزیهشده در FEATURE_STORE_DIR و بازگرداندن مسیر آن.
+    حفظ مصفوفة ميزات الملف المحلل مرة واحدة في FEATURE_STORE_DIR وإرجاع مساره.
+    Enregistrer une seule fois la matrice de caractéristiques dans FEATURE_STORE_DIR et retourner son chemin.
+    """
+    path = os.path.join(FEATURE_STORE_DIR, f'clustering-{file_hash}.npy')
+    try:
+        # Refresh the mtime on a hit, so pruning drops the least recently used files, not the oldest.
+        os.utime(path)
+        return path
+    except FileNotFoundError:
+        pass
+    # Convert first: a bad upload must fail before anything is created in the store.
+    features = feature_matrix(data)
+    # Write under a private name and rename, so concurrent workers never map a half-written file.
+    fd, tmp_path = tempfile.mkstemp(dir=FEATURE_STORE_DIR, suffix='.npy.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            np.save(tmp, features)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    stored = []
+    for name in os.listdir(FEATURE_STORE_DIR):
+        if name.startswith('clustering-') and name.endswith('.npy'):
+            try:
+                stat = os.stat(os.path.join(FEATURE_STORE_DIR, name))
+            except FileNotFoundError:
+                # Another worker is pruning the store at the same time.
+                continue
+            stored.append((stat.st_mtime, stat.st_size, name))
+    stored.sort(reverse=True)
+    kept_bytes = 0
+    for rank, (_, size, name) in enumerate(stored):
+        kept_bytes += size
+        if rank and (rank >= FEATURE_STORE_SIZE or kept_bytes > FEATURE_STORE_BYTES):
+            try:
+                # Unlinking is safe while another process still has the file mapped.
+                os.remove(os.path.join(FEATURE_STORE_DIR, name))
+            except FileNotFoundError:
+                pass
+    return path
+
+
+def perform_clustering(data, method='kmeans', n_clusters=3, eps=0.5, min_samples=5, threshold=1.5,
+                       linkage_method='ward', backend='auto', vectorized=False, features=None):
     """
     Perform clustering on input data based on the selected method.
     اجرای خوشهبندی روی دادهها براساس روش انتخابشده.
     تنفيذ التصنيف بناءً على الطريقة المختارة.
     Effectuer le clustering en fonction de la méthode sélectionnée.
     """
-    names = data['Name']
-    features = data.drop(columns=['Name']).values
+    if features is None:
+        features = feature_matrix(data)
+    labels = cluster_labels(features, method=method, n_clusters=n_clusters, eps=eps, min_samples=min_samples,
+                            threshold=threshold, linkage_method=linkage_method, backend=backend,
+                            vectorized=vectorized)
+    output_data = pd.DataFrame({'Name': data['Name'], 'Cluster': labels})
+    return output_data
 
+
+def cluster_labels(features, method='kmeans', n_clusters=3, eps=0.5, min_samples=5, threshold=1.5,
+                   linkage_method='ward', backend='auto', vectorized=False):
+    """
+    Run the selected clusterer on a feature array or .npy path and return its labels.
+    اجرای خوشهبند انتخابشده روی آرایه ویژگیها یا مسیر .npy و بازگرداندن برچسبها.
+    تشغيل المصنف المختار على مصفوفة الميزات أو مسار .npy وإرجاع التسميات.
+    Exécuter le clustering choisi sur un tableau de caractéristiques ou un chemin .npy et retourner les étiquettes.
+    """
     if method == 'kmeans':
         clusterer = KMeansClusterer(features, n_clusters=n_clusters)
     elif method == 'dbscan':
-        clusterer = DBSCANClusterer(features, eps=eps, min_samples=min_samples)
+        clusterer = DBSCANClusterer(features, eps=eps, min_samples=min_samples, vectorized=vectorized)
     elif method == 'hierarchical':
-        clusterer = HierarchicalClusterer(features, method='ward', threshold=threshold)
+        clusterer = HierarchicalClusterer(features, method=linkage_method, threshold=threshold, backend=backend)
     elif method == 'meanshift':
         clusterer = MeanShiftClusterer(features)
     elif method == 'agglomerative':
@@ -146,10 +629,184 @@ def perform_clustering(data, method='kmeans', n_clusters=3, eps=0.5, min_samples
     else:
         raise ValueError("Invalid clustering method. Choose 'kmeans', 'dbscan', 'hierarchical', 'meanshift', or 'agglomerative'.")
 
-    labels = clusterer.fit_predict()
-    output_data = pd.DataFrame({'Name': names, 'Cluster': labels})
-    return output_data
-    
+    return compact_labels(clusterer.fit_predict())
+
+
+def compact_labels(labels):
+    """
+    Renumber labels to consecutive int32 ids from 0, keeping DBSCAN's noise label -1.
+    شمارهگذاری مجدد برچسبها به شناسههای متوالی int32 از 0، با حفظ برچسب نویز -1 در DBSCAN.
+    إعادة ترقيم التسميات إلى معرفات int32 متتالية من 0، مع الإبقاء على تسمية الضوضاء -1 في DBSCAN.
+    Renuméroter les étiquettes en identifiants int32 consécutifs depuis 0, en gardant le bruit -1 de DBSCAN.
+    """
+    uniq, compact = np.unique(labels, return_inverse=True)
+    if len(uniq) and uniq[0] == -1:
+        compact = compact - 1
+    return compact.astype(np.int32)
+
+
+def init_worker(n_threads):
+    """
+    Limit the Numba and BLAS thread pools of a clustering worker process to n_threads.
+    محدود کردن رشته‌های Numba و BLAS در پردازه خوشه‌بندی به n_threads.
+    تقييد خيوط Numba و BLAS في عملية التصنيف إلى n_threads.
+    Limiter les threads Numba et BLAS d'un processus de clustering à n_threads.
+    """
+    # Environment variables would come too late: spawn imports numpy before the initializer runs.
+    threadpool_limits(limits=n_threads)
+    if numba is not None:
+        numba.set_num_threads(min(n_threads, numba.config.NUMBA_NUM_THREADS))
+
+
+def get_executor(broken=None):
+    """
+    Return the process pool used for clustering, starting it on first use or replacing broken.
+    بازگرداندن مجموعه پردازههای خوشهبندی، با راهاندازی در اولین استفاده یا جایگزینی broken.
+    إرجاع مجموعة العمليات المستخدمة للتصنيف، مع تشغيلها عند أول استخدام أو استبدال broken.
+    Retourner le pool de processus de clustering, démarré à la première utilisation ou remplaçant broken.
+    """
+    global _executor
+    with _executor_lock:
+        # Only the first thread to see a given pool break replaces it; the others get the new one.
+        if broken is not None and _executor is broken:
+            broken.shutdown(wait=False)
+            _executor = None
+        if _executor is None:
+            # spawn, not fork: the parent runs Flask's request threads, which fork would copy mid-flight.
+            _executor = ProcessPoolExecutor(max_workers=WORKER_PROCESSES, mp_context=multiprocessing.get_context('spawn'),
+                                            initializer=init_worker, initargs=(WORKER_THREADS,))
+        return _executor
+
+
+def run_in_worker(fn, *args, **kwargs):
+    """
+    Run fn in the clustering pool and return its result, retrying once on a fresh pool if a worker died.
+    اجرای fn در مجموعه پردازه‌ها و بازگرداندن نتیجه، با یک بار تلاش مجدد روی مجموعه تازه اگر پردازه‌ای از کار افتاد.
+    تشغيل fn في مجموعة العمليات وإرجاع النتيجة، مع إعادة المحاولة مرة على مجموعة جديدة إذا توقفت عملية.
+    Exécuter fn dans le pool et retourner son résultat, en réessayant une fois sur un nouveau pool si un processus meurt.
+    """
+    executor = get_executor()
+    try:
+        return executor.submit(fn, *args, **kwargs).result()
+    except BrokenProcessPool:
+        # A worker was killed (out of memory, a signal); the pool rejects all further work until replaced.
+        return get_executor(broken=executor).submit(fn, *args, **kwargs).result()
+
+
+def load_dataframe(file_hash, file_bytes):
+    """
+    Parse an uploaded Excel file, reusing the result for files already seen.
+    تجزیه فایل اکسل آپلودشده، با استفاده مجدد از نتیجه برای فایلهای تکراری.
+    تحليل ملف Excel المرفوع، مع إعادة استخدام النتيجة للملفات المكررة.
+    Analyser le fichier Excel téléchargé, en réutilisant le résultat pour les fichiers déjà vus.
+    """
+    with _cache_lock:
+        data = _parsed_frames.get(file_hash)
+        if data is not None:
+            _parsed_frames.move_to_end(file_hash)
+            return data
+    # Parse outside the lock so one slow upload does not stall every other request.
+    try:
+        data = pd.read_excel(io.BytesIO(file_bytes), engine='calamine', dtype_backend='pyarrow')
+    except ImportError:
+        # python-calamine is missing; fall back to the default openpyxl reader.
+        data = pd.read_excel(io.BytesIO(file_bytes))
+    with _cache_lock:
+        _parsed_frames[file_hash] = data
+        if len(_parsed_frames) > PARSED_FRAME_CACHE_SIZE:
+            _parsed_frames.popitem(last=False)
+    return data
+
+
+def perform_clustering_cached(file_hash, data, method, n_clusters, eps, min_samples, threshold, linkage_method, backend,
+                              vectorized):
+    """
+    Cluster the frame parsed from a file, memoized on the file hash and the parameters.
+    خوشهبندی جدول تجزیهشده از یک فایل، با حافظه نهان براساس هش فایل و پارامترها.
+    تصنيف الجدول المحلل من ملف، مع تخزين مؤقت حسب بصمة الملف والمعاملات.
+    Regrouper la table analysée d'un fichier, mémoïsé selon l'empreinte du fichier et les paramètres.
+    Returns (names, labels).
+    بازگرداندن (نامها، برچسبها).
+    إرجاع (الأسماء، التسميات).
+    Retourne (noms, étiquettes).
+    """
+    key = (file_hash, method, n_clusters, eps, min_samples, threshold, linkage_method, backend, vectorized)
+    with _cache_lock:
+        result = _cluster_results.get(key)
+        if result is not None:
+            _cluster_results.move_to_end(key)
+            return result
+    # Workers receive the .npy path and map it themselves, so the feature block is never pickled.
+    params = dict(method=method, n_clusters=n_clusters, eps=eps, min_samples=min_samples, threshold=threshold,
+                  linkage_method=linkage_method, backend=backend, vectorized=vectorized)
+    try:
+        labels = run_in_worker(cluster_labels, store_features(file_hash, data), **params)
+    except FileNotFoundError:
+        # Another request pruned the file before the worker mapped it; store it again and retry once.
+        labels = run_in_worker(cluster_labels, store_features(file_hash, data), **params)
+    result = data['Name'], labels
+    with _cache_lock:
+        _cluster_results[key] = result
+        if len(_cluster_results) > RESULT_CACHE_SIZE:
+            _cluster_results.popitem(last=False)
+    return result
+
+
+def write_result(names, labels, output_format, buffer):
+    """
+    Write the Name/Cluster table to buffer in the requested format.
+    نوشتن جدول Name/Cluster در buffer با قالب درخواستشده.
+    كتابة جدول Name/Cluster في buffer بالصيغة المطلوبة.
+    Écrire la table Name/Cluster dans buffer au format demandé.
+    """
+    if output_format == 'xlsx':
+        pd.DataFrame({'Name': names, 'Cluster': labels}).to_excel(buffer, index=False)
+        return
+    if names.dtype == object:
+        # Excel columns often mix text and numbers, but an Arrow column has one type; keep blanks as nulls.
+        names = names.where(names.isna(), names.astype(str))
+    # Build the Arrow table straight from the columns, without a pandas frame in between.
+    table = pa.table({'Name': pa.array(names), 'Cluster': pa.array(np.asarray(labels, dtype=np.int32))})
+    if output_format == 'parquet':
+        # Dictionary encoding shrinks the Name column further when names repeat.
+        pq.write_table(table, buffer, compression='zstd', use_dictionary=True)
+    else:
+        feather.write_feather(table, buffer)
+
+
+# Built once at import instead of on every /clustering-guide request.
+CLUSTERING_GUIDES = {
+    "english": {
+        "kmeans": "KMeans is best suited for spherical clusters with similar sizes and requires the number of clusters as input.",
+        "dbscan": "DBSCAN is ideal for detecting arbitrary-shaped clusters and noise, without needing the number of clusters.",
+        "hierarchical": "Hierarchical clustering is suitable for hierarchical structures, with dendrograms to visualize relationships.",
+        "meanshift": "MeanShift is good for finding clusters with a high-density region without needing the number of clusters.",
+        "agglomerative": "Agglomerative clustering works well for building a hierarchy of clusters using a bottom-up approach."
+    },
+    "farsi": {
+        "kmeans": "KMeans برای خوشههای کروی با اندازههای مشابه و نیازمند تعداد خوشهها به عنوان ورودی مناسب است.",
+        "dbscan": "DBSCAN برای شناسایی خوشههای با اشکال دلخواه و نویز، بدون نیاز به تعداد خوشهها ایدهآل است.",
+        "hierarchical": "خوشهبندی سلسلهمراتبی برای ساختارهای سلسلهمراتبی مناسب است و دندروگرامها روابط را نمایش میدهند.",
+        "meanshift": "MeanShift برای یافتن خوشههای با ناحیه تراکم بالا، بدون نیاز به تعداد خوشهها خوب است.",
+        "agglomerative": "خوشهبندی Agglomerative برای ساخت سلسلهمراتب خوشهها از پایین به بالا مناسب است."
+    },
+    "arabic": {
+        "kmeans": "KMeans مناسب لتصنيف المجموعات الكروية المتشابهة الحجم ويتطلب إدخال عدد المجموعات.",
+        "dbscan": "DBSCAN مثالي لاكتشاف المجموعات ذات الأشكال التعسفية والضوضاء، دون الحاجة إلى عدد المجموعات.",
+        "hierarchical": "التصنيف الهرمي مناسب للهياكل الهرمية، ويعرض العلاقات عبر المخططات الشجرية.",
+        "meanshift": "MeanShift جيد لتحديد المجموعات ذات الكثافة العالية دون الحاجة إلى عدد المجموعات.",
+        "agglomerative": "التصنيف التجميعي مناسب لبناء تسلسل هرمي من المجموعات باستخدام نهج من الأسفل إلى الأعلى."
+    },
+    "french": {
+        "kmeans": "KMeans est idéal pour les clusters sphériques de taille similaire et nécessite le nombre de clusters en entrée.",
+        "dbscan": "DBSCAN est idéal pour détecter des clusters de formes arbitraires et le bruit, sans nécessiter le nombre de clusters.",
+        "hierarchical": "Le clustering hiérarchique est adapté aux structures hiérarchiques et utilise des dendrogrammes pour visualiser les relations.",
+        "meanshift": "MeanShift est bien adapté pour trouver des clusters avec une région de forte densité sans nécessiter le nombre de clusters.",
+        "agglomerative": "Le clustering agglomératif fonctionne bien pour construire une hiérarchie de clusters avec une approche ascendante."
+    }
+}
+
+
 def get_clustering_guide(language):
     """
     Returns a guide on when to use each clustering algorithm based on the specified language.
@@ -157,37 +814,10 @@ def get_clustering_guide(language):
     إرجاع دليل لاختيار طريقة التصنيف بناءً على اللغة المحددة.
     Retourner un guide pour choisir la méthode de clustering en fonction de la langue spécifiée.
     """
-    guides = {
-        "english": {
-            "kmeans": "KMeans is best suited for spherical clusters with similar sizes and requires the number of clusters as input.",
-            "dbscan": "DBSCAN is ideal for detecting arbitrary-shaped clusters and noise, without needing the number of clusters.",
-            "hierarchical": "Hierarchical clustering is suitable for hierarchical structures, with dendrograms to visualize relationships.",
-            "meanshift": "MeanShift is good for finding clusters with a high-density region without needing the number of clusters.",
-            "agglomerative": "Agglomerative clustering works well for building a hierarchy of clusters using a bottom-up approach."
-},
-        "farsi": {
-            "kmeans": "KMeans برای خوشههای کروی با اندازههای مشابه و نیازمند تعداد خوشهها به عنوان ورودی مناسب است.",
-            "dbscan": "DBSCAN برای شناسایی خوشههای با اشکال دلخواه و نویز، بدون نیاز به تعداد خوشهها ایدهآل است.",
-            "hierarchical": "خوشهبندی سلسلهمراتبی برای ساختارهای سلسلهمراتبی مناسب است و دندروگرامها روابط را نمایش میدهند.",
-            "meanshift": "MeanShift برای یافتن خوشههای با ناحیه تراکم بالا، بدون نیاز به تعداد خوشهها خوب است.",
-            "agglomerative": "خوشهبندی Agglomerative برای ساخت سلسلهمراتب خوشهها از پایین به بالا مناسب است."
-        },
-        "arabic": {
-            "kmeans": "KMeans مناسب لتصنيف المجموعات الكروية المتشابهة الحجم ويتطلب إدخال عدد المجموعات.",
-            "dbscan": "DBSCAN مثالي لاكتشاف المجموعات ذات الأشكال التعسفية والضوضاء، دون الحاجة إلى عدد المجموعات.",
-            "hierarchical": "التصنيف الهرمي مناسب للهياكل الهرمية، ويعرض العلاقات عبر المخططات الشجرية.",
-            "meanshift": "MeanShift جيد لتحديد المجموعات ذات الكثافة العالية دون الحاجة إلى عدد المجموعات.",
-            "agglomerative": "التصنيف التجميعي مناسب لبناء تسلسل هرمي من المجموعات باستخدام نهج من الأسفل إلى الأعلى."
-        },
-        "french": {
-            "kmeans": "KMeans est idéal pour les clusters sphériques de taille similaire et nécessite le nombre de clusters en entrée.",
-            "dbscan": "DBSCAN est idéal pour détecter des clusters de formes arbitraires et le bruit, sans nécessiter le nombre de clusters.",
-            "hierarchical": "Le clustering hiérarchique est adapté aux structures hiérarchiques et utilise des dendrogrammes pour visualiser les relations.",
-            "meanshift": "MeanShift est bien adapté pour trouver des clusters avec une région de forte densité sans nécessiter le nombre de clusters.",
-            "agglomerative": "Le clustering agglomératif fonctionne bien pour construire une hiérarchie de clusters avec une approche ascendante."
-        }
-    }
-    return guides.get(language.lower(), guides["english"])
+    guide = CLUSTERING_GUIDES.get(language)
+    if guide is None:
+        guide = CLUSTERING_GUIDES.get(language.lower(), CLUSTERING_GUIDES["english"])
+    return guide
 
 
 
@@ -208,18 +838,32 @@ def cluster_data():
     eps = float(request.form.get('eps', 0.5))
     min_samples = int(request.form.get('min_samples', 5))
     threshold = float(request.form.get('threshold', 1.5))
+    linkage_method = request.form.get('linkage', 'ward')
+    backend = request.form.get('backend', 'auto')
+    vectorized = request.form.get('vectorized', 'false').lower() == 'true'
+    output_format = request.form.get('format', 'parquet').lower()
+    if output_format not in OUTPUT_FORMATS:
+        return jsonify({"error": "Invalid output format. Choose 'parquet', 'feather', or 'xlsx'."}), 400
 
-    data = pd.read_excel(file)
+    file_bytes = file.read()
+    file_hash = blake3(file_bytes).hexdigest()
+    # The frame is passed on explicitly: another request may evict it from the cache at any time.
+    data = load_dataframe(file_hash, file_bytes)
 
     try:
-        result_df = perform_clustering(data, method=method, n_clusters=n_clusters, eps=eps, min_samples=min_samples, threshold=threshold)
+        names, labels = perform_clustering_cached(file_hash, data, method, n_clusters, eps, min_samples, threshold,
+                                                  linkage_method, backend, vectorized)
     except ValueError as e:
         return jsonify({"error": str(e)}), 400
+    except BrokenProcessPool:
+        return jsonify({"error": "The clustering worker crashed, possibly out of memory."}), 500
 
-    output_file = "clusters_output.xlsx"
-    result_df.to_excel(output_file, index=False)
+    output_file, mimetype = OUTPUT_FORMATS[output_format]
+    buffer = io.BytesIO()
+    write_result(names, labels, output_format, buffer)
+    buffer.seek(0)
 
-    return send_file(output_file, as_attachment=True)
+    return send_file(buffer, mimetype=mimetype, as_attachment=True, download_name=output_file)
     
     
 @app.route('/clustering-guide', methods=['GET'])
@@ -230,4 +874,6 @@ def clustering_guide():
     
 
 if __name__ == '__main__':
+    # Development server only; for concurrent clients serve with e.g.
+    # gunicorn --workers 2 --worker-class gthread --threads 8 CLUSTERING_API:app
     app.run(debug=True)
@@ -0,0 +1,245 @@
+"""
+Numba-compiled Lloyd iterations used by KMeansClusterer.
+تکرارهای Lloyd کامپایل‌شده با Numba برای KMeansClusterer.
+تكرارات Lloyd المترجمة باستخدام Numba لـ KMeansClusterer.
+Itérations de Lloyd compilées avec Numba pour KMeansClusterer.
+"""
+from functools import lru_cache
+import importlib.util
+import os
+import sys
+import tempfile
+
+import numpy as np
+from numba import njit, prange
+
+# Finite "infinity" for running minimums; fastmath lets the compiler assume no inf values.
+FLT_MAX = np.float32(3.4028235e38)
+
+# Widest feature count for which make_assign_kernel emits a fully unrolled kernel; wider inputs use BLAS.
+MAX_UNROLLED_FEATURES = 16
+
+# Generated kernels are written here as modules, so numba's on-disk cache (keyed on a source file) covers them
+# and each worker process loads a compiled kernel instead of spending a second or more on JIT.
+KERNEL_DIR = os.path.join(tempfile.gettempdir(), 'kmeans_numba_kernels')
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def _min_sq_dist(X, c, closest):
+    """
+    Lower each entry of closest to the squared distance between its sample and centroid c.
+    کاهش هر مقدار closest به مربع فاصله نمونه آن تا مرکز c.
+    تخفيض كل قيمة في closest إلى مربع المسافة بين عينتها والمركز c.
+    Réduire chaque valeur de closest au carré de la distance entre son échantillon et le centre c.
+    """
+    n, d = X.shape
+    for i in prange(n):
+        s = np.float32(0.0)
+        for f in range(d):
+            diff = X[i, f] - c[f]
+            s += diff * diff
+        if s < closest[i]:
+            closest[i] = s
+
+
+@njit(cache=True)
+def _kmeans_plusplus(X, n_clusters, seed):
+    """
+    Pick initial centroids with greedy k-means++ seeding, as sklearn does.
+    انتخاب مراکز اولیه با روش حریصانه k-means++، مانند sklearn.
+    اختيار المراكز الأولية بطريقة k-means++ الجشعة، كما في sklearn.
+    Choisir les centres initiaux avec k-means++ glouton, comme sklearn.
+    """
+    np.random.seed(seed)
+    n, d = X.shape
+    # Each step samples several candidates and keeps the one that lowers the potential most.
+    n_local_trials = 2 + int(np.log(n_clusters))
+    C = np.empty((n_clusters, d), dtype=X.dtype)
+    C[0] = X[np.random.randint(n)]
+    closest = np.full(n, FLT_MAX, dtype=X.dtype)
+    _min_sq_dist(X, C[0], closest)
+    trial = np.empty_like(closest)
+    for j in range(1, n_clusters):
+        cumulative = np.cumsum(closest.astype(np.float64))
+        best_pick = np.random.randint(n)
+        best_closest = closest.copy()
+        best_potential = np.inf
+        for _ in range(n_local_trials):
+            pick = np.random.randint(n)
+            if cumulative[-1] > 0:
+                pick = min(np.searchsorted(cumulative, np.random.random() * cumulative[-1]), n - 1)
+            trial[:] = closest
+            _min_sq_dist(X, X[pick], trial)
+            potential = trial.astype(np.float64).sum()
+            if potential < best_potential:
+                best_potential = potential
+                best_pick = pick
+                best_closest[:] = trial
+        C[j] = X[best_pick]
+        closest[:] = best_closest
+    return C
+
+
+@lru_cache(maxsize=None)
+def make_assign_kernel(d):
+    """
+    Generate and compile a nearest-centroid assignment kernel for exactly d features, with the feature loop unrolled.
+    تولید و کامپایل کرنل تخصیص به نزدیک‌ترین مرکز برای دقیقاً d ویژگی، با حلقه ویژگی بازشده.
+    توليد وترجمة نواة تعيين لأقرب مركز لعدد d من الميزات بالضبط، مع فك حلقة الميزات.
+    Générer et compiler un noyau d'affectation au centre le plus proche pour exactement d caractéristiques, boucle déroulée.
+    """
+    # Each sample's coordinates become scalars the compiler keeps in registers across all k centroids.
+    lines = [
+        'import numpy as np',
+        'from numba import njit, prange',
+        '',
+        f'FLT_MAX = np.float32({float(FLT_MAX)!r})',
+        '',
+        '',
+        '@njit(parallel=True, fastmath=True, cache=True)',
+        'def _assign_unrolled(X, C, labels, dists):',
+        '    n = X.shape[0]',
+        '    k = C.shape[0]',
+        '    for i in prange(n):',
+    ]
+    lines += [f'        x{f} = X[i, {f}]' for f in range(d)]
+    lines += ['        best = FLT_MAX', '        best_j = 0', '        for j in range(k):']
+    for f in range(d):
+        lines += [f'            t = x{f} - C[j, {f}]', f'            s {"=" if f == 0 else "+="} t * t']
+    lines += [
+        '            if s < best:',
+        '                best = s',
+        '                best_j = j',
+        '        labels[i] = best_j',
+        '        dists[i] = best',
+    ]
+    src = '\n'.join(lines) + '\n'
+    name = f'kmeans_numba_assign_{d}'
+    path = os.path.join(KERNEL_DIR, name + '.py')
+    os.makedirs(KERNEL_DIR, exist_ok=True)
+    try:
+        with open(path) as f:
+            current = f.read()
+    except FileNotFoundError:
+        current = None
+    if current != src:
+        # Rewrite only when the source changed: numba invalidates its cache whenever the file's mtime moves.
+        fd, tmp_path = tempfile.mkstemp(dir=KERNEL_DIR, suffix='.py.tmp')
+        with os.fdopen(fd, 'w') as tmp:
+            tmp.write(src)
+        os.replace(tmp_path, path)
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    # Registered by name: numba re-imports the defining module when it loads a cached kernel.
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module._assign_unrolled
+
+
+@njit(cache=True)
+def _update(X, labels, dists, C, counts):
+    """
+    Move each centroid in C to the mean of its assigned rows; empty clusters move to the farthest samples.
+    انتقال هر مرکز به میانگین سطرهای اختصاص‌یافته؛ خوشه‌های خالی به دورترین نمونه‌ها منتقل می‌شوند.
+    نقل كل مركز إلى متوسط صفوفه؛ تنتقل المجموعات الفارغة إلى أبعد العينات.
+    Déplacer chaque centre vers la moyenne de ses lignes ; les clusters vides vont aux échantillons les plus éloignés.
+    """
+    n, d = X.shape
+    k = C.shape[0]
+    sums = np.zeros((k, d), dtype=np.float64)
+    counts[:] = 0
+    for i in range(n):
+        j = labels[i]
+        counts[j] += 1
+        for f in range(d):
+            sums[j, f] += X[i, f]
+    for j in range(k):
+        if counts[j] > 0:
+            for f in range(d):
+                C[j, f] = sums[j, f] / counts[j]
+    # Like sklearn: reseed each empty cluster on one of the samples worst served by its centroid.
+    n_empty = 0
+    for j in range(k):
+        if counts[j] == 0:
+            n_empty += 1
+    if n_empty:
+        farthest = np.argsort(dists)[::-1]
+        for j in range(k):
+            if counts[j] == 0:
+                n_empty -= 1
+                i = farthest[n_empty]
+                for f in range(d):
+                    C[j, f] = X[i, f]
+
+
+def _assign_gemm(Xc, x_sq, offset, C, labels, dists):
+    """
+    Assign rows of Xc to centroids using ||x||^2 + ||c||^2 - 2 x.c, with x.c computed as one GEMM.
+    اختصاص سطرهای Xc به مراکز با ||x||^2 + ||c||^2 - 2 x.c که x.c با یک GEMM محاسبه می‌شود.
+    تعيين صفوف Xc للمراكز باستخدام ||x||^2 + ||c||^2 - 2 x.c مع حساب x.c بعملية GEMM واحدة.
+    Affecter les lignes de Xc aux centres via ||x||^2 + ||c||^2 - 2 x.c, x.c étant un seul GEMM.
+    Xc is X - offset and x_sq its float64 squared row norms; C stays in the original coordinates.
+    Xc همان X - offset و x_sq مربع نرم float64 سطرهای آن است؛ C در مختصات اصلی می‌ماند.
+    Xc هو X - offset و x_sq مربعات أطوال صفوفه بدقة float64؛ يبقى C في الإحداثيات الأصلية.
+    Xc vaut X - offset et x_sq ses normes carrées float64 ; C reste dans les coordonnées d'origine.
+    """
+    Cc = C - offset
+    # Centered operands keep the products near the spread of the data; the sums run in float64.
+    D = np.dot(Xc, Cc.T.astype(Xc.dtype)).astype(np.float64)
+    D *= -2.0
+    D += x_sq[:, None]
+    D += np.einsum('ij,ij->i', Cc, Cc)[None, :]
+    np.argmin(D, axis=1, out=labels)
+    # Cancellation can leave tiny negative values for points sitting on a centroid.
+    np.maximum(np.take_along_axis(D, labels[:, None], axis=1)[:, 0], 0, out=dists)
+
+
+def lloyd(X, n_clusters, max_iter=300, tol=1e-4, seed=0, x_sq=None, offset=None):
+    """
+    Run Lloyd's algorithm on a C-contiguous float32 matrix and return (labels, centroids, inertia).
+    اجرای الگوریتم Lloyd روی ماتریس float32 پیوسته و بازگرداندن (برچسب‌ها، مراکز، اینرسی).
+    تشغيل خوارزمية Lloyd على مصفوفة float32 متصلة وإرجاع (التسميات، المراكز، العطالة).
+    Exécuter l'algorithme de Lloyd sur une matrice float32 contiguë et retourner (étiquettes, centres, inertie).
+    When x_sq (the squared row norms of X - offset) is given, assignment uses BLAS instead of the Numba kernel.
+    اگر x_sq (مربع نرم سطرهای X - offset) داده شود، تخصیص با BLAS به جای کرنل Numba انجام می‌شود.
+    إذا أُعطي x_sq (مربعات أطوال صفوف X - offset) يتم التعيين عبر BLAS بدلاً من نواة Numba.
+    Si x_sq (normes carrées des lignes de X - offset) est fourni, l'affectation utilise BLAS au lieu du noyau Numba.
+    """
+    n = X.shape[0]
+    # The kernels read X row-major: each sample's features are loaded once and reused across all k
+    # centroids, with the feature loop innermost. A feature-major copy measured no faster for these
+    # loops, so X is not transposed.
+    # Same convergence rule as sklearn: tol is relative to the mean feature variance.
+    tol = tol * float(np.mean(np.var(X, axis=0)))
+    C = _kmeans_plusplus(X, n_clusters, seed)
+    labels = np.empty(n, dtype=np.int64)
+    dists = np.empty(n, dtype=X.dtype)
+    counts = np.empty(n_clusters, dtype=np.int64)
+
+    if x_sq is None and X.shape[1] > MAX_UNROLLED_FEATURES:
+        # Too wide to unroll, and BLAS wins at this width anyway: take the norms here and use the GEMM path.
+        offset = X.mean(axis=0, dtype=np.float64)
+        centered = X - offset
+        x_sq = np.einsum('ij,ij->i', centered, centered)
+
+    if x_sq is None:
+        assign_kernel = make_assign_kernel(X.shape[1])
+    else:
+        if offset is None:
+            offset = np.zeros(X.shape[1])
+        Xc = (X - offset).astype(X.dtype)
+
+    def assign():
+        if x_sq is None:
+            assign_kernel(X, C, labels, dists)
+        else:
+            _assign_gemm(Xc, x_sq, offset, C, labels, dists)
+
+    for _ in range(max_iter):
+        assign()
+        previous = C.copy()
+        _update(X, labels, dists, C, counts)
+        if float(((C - previous) ** 2).sum()) <= tol:
+            break
+    assign()
+    return labels, C, float(dists.sum())
@@ -0,0 +1,175 @@
+"""
+Numba-compiled nearest-neighbor-chain Ward linkage used by HierarchicalClusterer.
+پیوند Ward با زنجیره نزدیک‌ترین همسایه، کامپایل‌شده با Numba برای HierarchicalClusterer.
+ربط Ward بسلسلة أقرب جار، مترجم باستخدام Numba لـ HierarchicalClusterer.
+Liaison de Ward par chaîne des plus proches voisins, compilée avec Numba pour HierarchicalClusterer.
+"""
+import numpy as np
+from numba import njit, prange
+
+
+@njit(inline='always')
+def _condensed_index(n, i, j):
+    """
+    Position of pair (i, j) in a condensed distance matrix of n points.
+    موقعیت جفت (i, j) در ماتریس فاصله فشرده n نقطه.
+    موضع الزوج (i, j) في مصفوفة المسافات المضغوطة لـ n نقطة.
+    Position de la paire (i, j) dans une matrice de distances condensée de n points.
+    """
+    # prange indices can be typed uint64; mixed with int64 Numba unifies them to float64, which
+    # cannot index an array. Cast both explicitly and take min/max instead of swapping in place.
+    i = np.int64(i)
+    j = np.int64(j)
+    a = min(i, j)
+    b = max(i, j)
+    return n * a - (a * (a + 1)) // 2 + (b - a - 1)
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def _condensed_sq_dists(X):
+    """
+    Condensed matrix of squared Euclidean distances between the rows of X.
+    ماتریس فشرده مربع فاصله‌های اقلیدسی بین سطرهای X.
+    المصفوفة المضغوطة لمربعات المسافات الإقليدية بين صفوف X.
+    Matrice condensée des carrés des distances euclidiennes entre les lignes de X.
+    """
+    n, d = X.shape
+    D = np.empty(n * (n - 1) // 2, dtype=np.float32)
+    for i in prange(n):
+        base = n * i - (i * (i + 1)) // 2 - i - 1
+        for j in range(i + 1, n):
+            s = np.float32(0.0)
+            for f in range(d):
+                diff = X[i, f] - X[j, f]
+                s += diff * diff
+            D[base + j] = s
+    return D
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def _ward_lw(D, n, i, j, size, active):
+    """
+    Lance-Williams Ward update: overwrite row j of D with distances to the union of clusters i and j.
+    به‌روزرسانی Lance-Williams برای Ward: بازنویسی سطر j از D با فاصله تا اجتماع خوشه‌های i و j.
+    تحديث Lance-Williams لـ Ward: استبدال الصف j من D بالمسافات إلى اتحاد المجموعتين i و j.
+    Mise à jour de Lance-Williams pour Ward : remplacer la ligne j de D par les distances à l'union de i et j.
+    """
+    s_i = np.float32(size[i])
+    s_j = np.float32(size[j])
+    d_ij = D[_condensed_index(n, i, j)]
+    for k in prange(n):
+        if active[k] and k != i and k != j:
+            s_k = np.float32(size[k])
+            ik = _condensed_index(n, i, k)
+            jk = _condensed_index(n, j, k)
+            D[jk] = ((s_i + s_k) * D[ik] + (s_j + s_k) * D[jk] - s_k * d_ij) / (s_i + s_j + s_k)
+
+
+@njit(cache=True)
+def _nn_chain(D, n):
+    """
+    Run the nearest-neighbor chain on squared Ward distances; return merges as (a, b, height) in chain order.
+    اجرای زنجیره نزدیک‌ترین همسایه روی مربع فاصله‌های Ward؛ بازگرداندن ادغام‌ها به ترتیب زنجیره.
+    تشغيل سلسلة أقرب جار على مربعات مسافات Ward؛ إرجاع عمليات الدمج بترتيب السلسلة.
+    Exécuter la chaîne des plus proches voisins sur les distances de Ward ; retourner les fusions dans l'ordre.
+    """
+    active = np.ones(n, dtype=np.bool_)
+    size = np.ones(n, dtype=np.int64)
+    chain = np.empty(n, dtype=np.int64)
+    merge_a = np.empty(n - 1, dtype=np.int64)
+    merge_b = np.empty(n - 1, dtype=np.int64)
+    height = np.empty(n - 1, dtype=np.float64)
+    chain_len = 0
+    first = 0
+    for step in range(n - 1):
+        if chain_len == 0:
+            while not active[first]:
+                first += 1
+            chain[0] = first
+            chain_len = 1
+        while True:
+            x = chain[chain_len - 1]
+            # Start from the previous chain element so ties keep the chain from cycling.
+            y = -1
+            best = np.inf
+            if chain_len > 1:
+                y = chain[chain_len - 2]
+                best = D[_condensed_index(n, x, y)]
+            for k in range(n):
+                if active[k] and k != x:
+                    dist = D[_condensed_index(n, x, k)]
+                    if dist < best:
+                        best = dist
+                        y = k
+            if chain_len > 1 and y == chain[chain_len - 2]:
+                break
+            chain[chain_len] = y
+            chain_len += 1
+        chain_len -= 2
+        a = min(x, y)
+        b = max(x, y)
+        merge_a[step] = a
+        merge_b[step] = b
+        height[step] = np.sqrt(max(best, 0.0))
+        # The union lives on in slot b; slot a is retired.
+        _ward_lw(D, n, a, b, size, active)
+        size[b] += size[a]
+        active[a] = False
+    return merge_a, merge_b, height
+
+
+@njit(cache=True)
+def _find(parent, i):
+    """
+    Union-find root of i with path halving.
+    ریشه i در union-find با نصف‌کردن مسیر.
+    جذر i في union-find مع تنصيف المسار.
+    Racine de i dans l'union-find avec division du chemin.
+    """
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+@njit(cache=True)
+def _to_linkage(merge_a, merge_b, height, n):
+    """
+    Convert chain-order merges into a scipy linkage matrix sorted by height.
+    تبدیل ادغام‌های ترتیب زنجیره به ماتریس پیوند scipy مرتب‌شده براساس ارتفاع.
+    تحويل عمليات الدمج بترتيب السلسلة إلى مصفوفة ربط scipy مرتبة حسب الارتفاع.
+    Convertir les fusions dans l'ordre de la chaîne en matrice de liaison scipy triée par hauteur.
+    """
+    order = np.argsort(height, kind='mergesort')
+    parent = np.arange(2 * n - 1)
+    cluster_size = np.ones(2 * n - 1, dtype=np.int64)
+    Z = np.empty((n - 1, 4), dtype=np.float64)
+    for step in range(n - 1):
+        m = order[step]
+        ra = _find(parent, merge_a[m])
+        rb = _find(parent, merge_b[m])
+        new = n + step
+        parent[ra] = new
+        parent[rb] = new
+        cluster_size[new] = cluster_size[ra] + cluster_size[rb]
+        Z[step, 0] = min(ra, rb)
+        Z[step, 1] = max(ra, rb)
+        Z[step, 2] = height[m]
+        Z[step, 3] = cluster_size[new]
+    return Z
+
+
+def ward_linkage(X):
+    """
+    Ward linkage of the rows of a float32 matrix, returned in scipy's (n-1, 4) format.
+    پیوند Ward سطرهای یک ماتریس float32، با قالب (n-1, 4) کتابخانه scipy.
+    ربط Ward لصفوف مصفوفة float32، بصيغة scipy ذات الشكل (n-1, 4).
+    Liaison de Ward des lignes d'une matrice float32, au format (n-1, 4) de scipy.
+    """
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    n = X.shape[0]
+    if n < 2:
+        raise ValueError("Ward linkage needs at least two samples.")
+    D = _condensed_sq_dists(X)
+    merge_a, merge_b, height = _nn_chain(D, n)
+    return _to_linkage(merge_a, merge_b, height, n)